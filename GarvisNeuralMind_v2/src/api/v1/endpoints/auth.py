@@ -2,30 +2,96 @@
 Authentication endpoints for community features.
 """
 
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-
+import asyncio
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional, Dict, Any, Tuple
+
+import bcrypt
+import jwt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHash, VerificationError
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from jwt import PyJWTError
 
 from src.core.config import get_settings
-from src.core.database import AsyncSessionLocal, User
-from src.community.manager import CommunityManager
+from src.core.database import User, get_db, revoke_token_digest, is_token_digest_revoked
+from src.community.manager import community_manager
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, or_
+from sqlalchemy.exc import IntegrityError
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 settings = get_settings()
 security = HTTPBearer()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_UTC = timezone.utc
+
+# Token settings resolved once instead of on every encode/decode
+SECRET_KEY = settings.SECRET_KEY
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+EXPIRES_IN_SECONDS = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+# Password hashing (argon2id); bcrypt hashes from older accounts are still
+# accepted and upgraded on the next successful login. One lane per hash: the
+# worker pool below provides the concurrency.
+PASSWORD_HASH_MEMORY_KIB = 65536
+password_hasher = PasswordHasher(time_cost=2, memory_cost=PASSWORD_HASH_MEMORY_KIB, parallelism=1)
+
+# Hashing is CPU- and memory-bound: run it on a dedicated pool sized so that
+# concurrent hashes fit the memory budget
+PASSWORD_HASH_WORKERS = max(1, min(
+    os.cpu_count() or 1,
+    settings.PASSWORD_HASH_MEMORY_MB * 1024 // PASSWORD_HASH_MEMORY_KIB
+))
+password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+# Hashes admitted at once: one per worker plus as many again waiting in the
+# pool's queue. Beyond that requests are turned away instead of piling up.
+PASSWORD_HASH_SLOTS = PASSWORD_HASH_WORKERS * 2
+
+# Created on first use: on Python < 3.10 asyncio primitives bind to the loop
+# current at construction, which at import time is not the serving loop
+_password_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_password_semaphore() -> asyncio.Semaphore:
+    """Return the hashing semaphore, creating it inside the running loop."""
+    global _password_semaphore
+    if _password_semaphore is None:
+        _password_semaphore = asyncio.Semaphore(PASSWORD_HASH_SLOTS)
+    return _password_semaphore
+
+
+@asynccontextmanager
+async def _password_hash_slot() -> AsyncIterator[None]:
+    """Hold a hashing slot, answering 503 at once when all are taken."""
+    semaphore = _get_password_semaphore()
+    if semaphore.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry",
+            headers={"Retry-After": "1"}
+        )
+    async with semaphore:
+        yield
+
+
+# Checked against on unknown emails so login timing does not reveal registered accounts
+DUMMY_PASSWORD_HASH = password_hasher.hash("garvis-dummy-password")
 
-# Community manager instance
-community_manager = CommunityManager()
+# Verified tokens: raw token -> (exp timestamp, user id). Only the signature
+# check is skipped on a hit; the user is still loaded in the request's session.
+TOKEN_CACHE_TTL = 60
+token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL)
 
 
 # Request/Response models
@@ -65,30 +131,90 @@ class UserProfile(BaseModel):
 
 
 # Utility functions
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+def _verify_password_sync(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against an argon2 or legacy bcrypt hash."""
+    if not hashed_password.startswith("$argon2"):
+        try:
+            return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+        except ValueError:
+            return False
+    
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHash):
+        return False
 
 
-def get_password_hash(password: str) -> str:
-    """Generate password hash."""
-    return pwd_context.hash(password)
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check whether a stored hash should be replaced with a current argon2id hash."""
+    if not hashed_password.startswith("$argon2"):
+        return True
+    return password_hasher.check_needs_rehash(hashed_password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash off the event loop."""
+    async with _password_hash_slot():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            password_pool, _verify_password_sync, plain_password, hashed_password
+        )
+
+
+async def get_password_hash(password: str) -> str:
+    """Generate password hash off the event loop."""
+    async with _password_hash_slot():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_pool, password_hasher.hash, password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token."""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    # RFC 7519 defines "sub" as a string
+    to_encode["sub"] = str(to_encode["sub"])
+    expire = datetime.now(_UTC) + (expires_delta or ACCESS_TOKEN_EXPIRES)
     
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+def _verify_token(token: str) -> Tuple[float, int]:
+    """Return a token's expiry and user id, checking its signature at most once per TOKEN_CACHE_TTL."""
+    cached = token_cache.get(token)
+    if cached is not None and cached[0] > time.time():
+        return cached
+    
+    payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    claims = (payload["exp"], int(payload["sub"]))
+    token_cache[token] = claims
+    return claims
+
+
+def invalidate_token(token: str):
+    """Drop a token from the validation cache."""
+    token_cache.pop(token, None)
+
+
+def _token_digest(token: str) -> str:
+    """Key a token by digest so revocation records don't store usable tokens."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def revoke_token(token: str):
+    """Reject a token on every worker for the rest of its lifetime."""
+    expires_at, _ = _verify_token(token)
+    ttl = int(expires_at - time.time()) + 1
+    if ttl > 0:
+        await revoke_token_digest(_token_digest(token), ttl)
+    invalidate_token(token)
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: AsyncSession = Depends(get_db)
+) -> User:
     """Get current user from JWT token."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -96,132 +222,149 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    token = credentials.credentials
     try:
-        payload = jwt.decode(credentials.credentials, settings.SECRET_KEY, algorithms=["HS256"])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+        _, user_id = _verify_token(token)
+    except (PyJWTError, KeyError, ValueError):
+        raise credentials_exception
+    
+    # Revocations live in Redis so a logout applies on every worker
+    if await is_token_digest_revoked(_token_digest(token)):
         raise credentials_exception
     
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-        if user is None:
-            raise credentials_exception
-        
-        # Register user activity
-        await community_manager.register_user_activity(user.id)
-        
-        return user
+    # Loaded per request so handlers get a live instance and account changes apply at once
+    user = await session.get(User, user_id)
+    if user is None:
+        invalidate_token(token)
+        raise credentials_exception
+    
+    # Buffer user activity; the community manager flushes it in bulk
+    community_manager.mark_user_active(user.id)
+    
+    return user
 
 
 # Authentication endpoints
 
 @router.post("/register", response_model=TokenResponse)
-async def register_user(user_data: UserRegistration):
+async def register_user(user_data: UserRegistration, session: AsyncSession = Depends(get_db)):
     """Register a new user."""
-    async with AsyncSessionLocal() as session:
-        # Check if user already exists
-        existing_email = await session.execute(
-            select(User).where(User.email == user_data.email)
-        )
-        if existing_email.scalar_one_or_none():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-        
-        existing_username = await session.execute(
-            select(User).where(User.username == user_data.username)
+    # Check if user already exists (email or username) in one round trip
+    existing = await session.execute(
+        select(User.email, User.username)
+        .where(or_(User.email == user_data.email, User.username == user_data.username))
+        .limit(2)
+    )
+    existing_rows = existing.all()
+    if any(row.email == user_data.email for row in existing_rows):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
         )
-        if existing_username.scalar_one_or_none():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already taken"
-            )
-        
-        # Create new user
-        hashed_password = get_password_hash(user_data.password)
-        new_user = User(
-            username=user_data.username,
-            email=user_data.email,
-            hashed_password=hashed_password,
-            display_name=user_data.display_name or user_data.username,
-            created_at=datetime.utcnow(),
-            last_active_at=datetime.utcnow()
+    if existing_rows:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already taken"
         )
-        
-        session.add(new_user)
+    
+    # Create new user
+    hashed_password = await get_password_hash(user_data.password)
+    now = datetime.now(_UTC)
+    new_user = User(
+        username=user_data.username,
+        email=user_data.email,
+        hashed_password=hashed_password,
+        display_name=user_data.display_name or user_data.username,
+        created_at=now,
+        last_active_at=now
+    )
+    
+    session.add(new_user)
+    try:
         await session.commit()
-        await session.refresh(new_user)
-        
-        # Create access token
-        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": new_user.id}, expires_delta=access_token_expires
-        )
-        
-        # Register user activity
-        await community_manager.register_user_activity(new_user.id)
-        
-        return TokenResponse(
-            access_token=access_token,
-            token_type="bearer",
-            expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-            user_id=new_user.id,
-            username=new_user.username
+    except IntegrityError:
+        # A concurrent registration won the race for the email or username
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or username already registered"
         )
+    # new_user.id comes back from the INSERT and sessions don't expire on
+    # commit, so no refresh round trip is needed
+    
+    # Create access token
+    access_token = create_access_token(
+        data={"sub": new_user.id}, expires_delta=ACCESS_TOKEN_EXPIRES
+    )
+    
+    # Register user activity
+    await community_manager.register_user_activity(new_user.id)
+    
+    return TokenResponse.model_construct(
+        access_token=access_token,
+        token_type="bearer",
+        expires_in=EXPIRES_IN_SECONDS,
+        user_id=new_user.id,
+        username=new_user.username
+    )
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login_user(user_credentials: UserLogin):
+async def login_user(user_credentials: UserLogin, session: AsyncSession = Depends(get_db)):
     """Authenticate user and return access token."""
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(User).where(User.email == user_credentials.email)
-        )
-        user = result.scalar_one_or_none()
-        
-        if not user or not verify_password(user_credentials.password, user.hashed_password):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect email or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        if not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Inactive user account"
-            )
-        
-        # Update last active
-        user.last_active_at = datetime.utcnow()
-        await session.commit()
-        
-        # Create access token
-        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": user.id}, expires_delta=access_token_expires
+    result = await session.execute(
+        select(User).where(User.email == user_credentials.email)
+    )
+    user = result.scalar_one_or_none()
+    
+    # Always run a verification so unknown emails cost as much as wrong passwords
+    password_valid = await verify_password(
+        user_credentials.password,
+        user.hashed_password if user else DUMMY_PASSWORD_HASH
+    )
+    
+    if not user or not password_valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-        
-        # Register user activity
-        await community_manager.register_user_activity(user.id)
-        
-        return TokenResponse(
-            access_token=access_token,
-            token_type="bearer",
-            expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-            user_id=user.id,
-            username=user.username
+    
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user account"
         )
+    
+    # Migrate bcrypt or outdated argon2 parameters while we have the plaintext
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await get_password_hash(user_credentials.password)
+    
+    # Update last active
+    user.last_active_at = datetime.now(_UTC)
+    await session.commit()
+    
+    # Create access token
+    access_token = create_access_token(
+        data={"sub": user.id}, expires_delta=ACCESS_TOKEN_EXPIRES
+    )
+    
+    # Register user activity
+    await community_manager.register_user_activity(user.id)
+    
+    return TokenResponse.model_construct(
+        access_token=access_token,
+        token_type="bearer",
+        expires_in=EXPIRES_IN_SECONDS,
+        user_id=user.id,
+        username=user.username
+    )
 
 
 @router.get("/me", response_model=UserProfile)
 async def get_current_user_profile(current_user: User = Depends(get_current_user)):
     """Get current user's profile."""
-    return UserProfile(
+    return UserProfile.model_construct(
         id=current_user.id,
         username=current_user.username,
         email=current_user.email,
@@ -238,10 +381,12 @@ async def get_current_user_profile(current_user: User = Depends(get_current_user
 
 
 @router.post("/logout")
-async def logout_user(current_user: User = Depends(get_current_user)):
-    """Logout user (client should discard token)."""
-    # In a real implementation, you might want to blacklist the token
-    # For now, we just return success
+async def logout_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: User = Depends(get_current_user)
+):
+    """Logout user and revoke the presented token."""
+    await revoke_token(credentials.credentials)
     return {"message": "Successfully logged out"}
 
 
@@ -249,15 +394,14 @@ async def logout_user(current_user: User = Depends(get_current_user)):
 async def refresh_token(current_user: User = Depends(get_current_user)):
     """Refresh user's access token."""
     # Create new access token
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": current_user.id}, expires_delta=access_token_expires
+        data={"sub": current_user.id}, expires_delta=ACCESS_TOKEN_EXPIRES
     )
     
-    return TokenResponse(
+    return TokenResponse.model_construct(
         access_token=access_token,
         token_type="bearer",
-        expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        expires_in=EXPIRES_IN_SECONDS,
         user_id=current_user.id,
         username=current_user.username
     )
@@ -2,7 +2,9 @@
 API Router - Main routing for community features.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer
 from typing import List, Optional, Dict, Any
 
@@ -14,7 +16,7 @@ from src.core.config import get_settings
 settings = get_settings()
 
 # Create main API router
-api_router = APIRouter()
+api_router = APIRouter(default_response_class=ORJSONResponse)
 
 # Security scheme
 security = HTTPBearer()
@@ -56,46 +58,51 @@ api_router.include_router(
     tags=["ai-companions"]
 )
 
+# Static payloads, serialized once at import
+HEALTH_RESPONSE_BODY = orjson.dumps({
+    "status": "healthy",
+    "service": "GarvisNeuralMind Community API",
+    "version": "2.0.0",
+    "endpoints": {
+        "auth": "/api/v1/auth",
+        "users": "/api/v1/users", 
+        "communities": "/api/v1/communities",
+        "posts": "/api/v1/posts",
+        "messages": "/api/v1/messages",
+        "ai_companions": "/api/v1/ai-companions"
+    }
+})
+
+INFO_RESPONSE_BODY = orjson.dumps({
+    "name": "GarvisNeuralMind Community API",
+    "version": "2.0.0",
+    "description": "AI-powered community platform with VTuber integration",
+    "features": {
+        "user_management": True,
+        "community_system": True,
+        "real_time_chat": True,
+        "ai_companions": True,
+        "vtuber_integration": True,
+        "discord_bridge": True,
+        "plugin_system": True
+    },
+    "documentation": {
+        "swagger": "/docs",
+        "redoc": "/redoc"
+    },
+    "websocket": {
+        "community_chat": "/ws/community/{user_id}"
+    }
+})
+
 # Global health check
 @api_router.get("/health", response_model=Dict[str, Any])
 async def health_check():
     """Global API health check."""
-    return {
-        "status": "healthy",
-        "service": "GarvisNeuralMind Community API",
-        "version": "2.0.0",
-        "endpoints": {
-            "auth": "/api/v1/auth",
-            "users": "/api/v1/users", 
-            "communities": "/api/v1/communities",
-            "posts": "/api/v1/posts",
-            "messages": "/api/v1/messages",
-            "ai_companions": "/api/v1/ai-companions"
-        }
-    }
+    return Response(content=HEALTH_RESPONSE_BODY, media_type="application/json")
 
 # API info endpoint
 @api_router.get("/info", response_model=Dict[str, Any])
 async def api_info():
     """Get API information and capabilities."""
-    return {
-        "name": "GarvisNeuralMind Community API",
-        "version": "2.0.0",
-        "description": "AI-powered community platform with VTuber integration",
-        "features": {
-            "user_management": True,
-            "community_system": True,
-            "real_time_chat": True,
-            "ai_companions": True,
-            "vtuber_integration": True,
-            "discord_bridge": True,
-            "plugin_system": True
-        },
-        "documentation": {
-            "swagger": "/docs",
-            "redoc": "/redoc"
-        },
-        "websocket": {
-            "community_chat": "/ws/community/{user_id}"
-        }
-    }
\ No newline at end of file
+    return Response(content=INFO_RESPONSE_BODY, media_type="application/json")
\ No newline at end of file
@@ -4,6 +4,7 @@ Discord Bot Integration - Bridge between Discord and GarvisNeuralMind Community.
 
 import asyncio
 import logging
+import re
 from typing import Optional, Dict, Any
 
 try:
@@ -19,12 +20,17 @@ from src.core.config import get_settings
 
 logger = logging.getLogger(__name__)
 
+# Keywords that make the bot answer a plain (non-command) message
+ASSISTANT_KEYWORDS_RE = re.compile(r"\b(?:ai|assistant|help)\b", re.IGNORECASE)
+
 
 class DiscordBot:
     """Discord bot for community integration."""
     
     def __init__(self):
         self.settings = get_settings()
+        self._bot_token = self.settings.DISCORD_BOT_TOKEN
+        self._guild_id: Optional[int] = None
         self.bot: Optional[commands.Bot] = None
         self._running = False
         
@@ -32,10 +38,17 @@ class DiscordBot:
             logger.warning("📱 Discord.py not available - Discord integration disabled")
             return
         
-        if not self.settings.DISCORD_BOT_TOKEN:
+        if not self._bot_token:
             logger.info("📱 Discord bot token not provided - Discord integration disabled")
             return
         
+        if self.settings.DISCORD_GUILD_ID:
+            try:
+                self._guild_id = int(self.settings.DISCORD_GUILD_ID)
+            except ValueError:
+                logger.error("📱 Invalid DISCORD_GUILD_ID %r - guild notifications disabled",
+                             self.settings.DISCORD_GUILD_ID)
+        
         # Initialize Discord bot
         intents = discord.Intents.default()
         intents.message_content = True
@@ -53,14 +66,14 @@ class DiscordBot:
     
     async def start(self):
         """Start the Discord bot."""
-        if not self.bot or not self.settings.DISCORD_BOT_TOKEN:
+        if not self.bot or not self._bot_token:
             logger.info("📱 Discord bot not starting - missing bot or token")
             return
         
         try:
             self._running = True
             # Start bot in background task
-            asyncio.create_task(self.bot.start(self.settings.DISCORD_BOT_TOKEN))
+            asyncio.create_task(self.bot.start(self._bot_token))
             logger.info("📱 Discord bot started successfully")
         except Exception as e:
             logger.error(f"📱 Failed to start Discord bot: {e}")
@@ -77,37 +90,56 @@ class DiscordBot:
         if not self.bot:
             return
         
+        # Static embeds are built once and reused for every invocation
+        help_embed = discord.Embed(
+            title="🤖 GarvisNeuralMind Commands",
+            description="Available community commands",
+            color=0x00ff00
+        )
+        
+        help_embed.add_field(
+            name="!garvis community",
+            value="Get community statistics",
+            inline=False
+        )
+        help_embed.add_field(
+            name="!garvis profile @user",
+            value="Get user profile information",
+            inline=False
+        )
+        help_embed.add_field(
+            name="!garvis invite",
+            value="Get invitation link to the web platform",
+            inline=False
+        )
+        help_embed.add_field(
+            name="!garvis ai <message>",
+            value="Chat with AI companion",
+            inline=False
+        )
+        
+        invite_embed = discord.Embed(
+            title="🌐 Join GarvisNeuralMind Platform",
+            description="Experience the full community features on our web platform!",
+            color=0xff9900
+        )
+        
+        invite_embed.add_field(
+            name="Features",
+            value="• AI Companions & VTuber interactions\n• Community posts & discussions\n• Real-time chat\n• User profiles & achievements\n• Plugin system",
+            inline=False
+        )
+        
+        invite_embed.add_field(
+            name="Access",
+            value="Visit: http://localhost:8000\n*(Update this with your actual domain)*",
+            inline=False
+        )
+        
         @self.bot.command(name="help")
         async def help_command(ctx):
             """Show available commands."""
-            embed = discord.Embed(
-                title="🤖 GarvisNeuralMind Commands",
-                description="Available community commands",
-                color=0x00ff00
-            )
-            
-            embed.add_field(
-                name="!garvis community",
-                value="Get community statistics",
-                inline=False
-            )
-            embed.add_field(
-                name="!garvis profile @user",
-                value="Get user profile information",
-                inline=False
-            )
-            embed.add_field(
-                name="!garvis invite",
-                value="Get invitation link to the web platform",
-                inline=False
-            )
-            embed.add_field(
-                name="!garvis ai <message>",
-                value="Chat with AI companion",
-                inline=False
-            )
-            
-            await ctx.send(embed=embed)
+            await ctx.send(embed=help_embed)
         
         @self.bot.command(name="community")
         async def community_stats(ctx):
@@ -115,8 +147,10 @@ class DiscordBot:
             try:
                 # This would integrate with the CommunityManager
                 stats = {
-                    "total_members": len(ctx.guild.members) if ctx.guild else 0,
-                    "online_members": len([m for m in ctx.guild.members if m.status != discord.Status.offline]) if ctx.guild else 0,
+                    "total_members": ctx.guild.member_count if ctx.guild else 0,
+                    "online_members": sum(
+                        1 for m in ctx.guild.members if m.status is not discord.Status.offline
+                    ) if ctx.guild else 0,
                     "platform_users": "Connect to web platform for detailed stats"
                 }
                 
@@ -172,25 +206,7 @@ class DiscordBot:
         @self.bot.command(name="invite")
         async def invite_command(ctx):
             """Get invitation link to the web platform."""
-            embed = discord.Embed(
-                title="🌐 Join GarvisNeuralMind Platform",
-                description="Experience the full community features on our web platform!",
-                color=0xff9900
-            )
-            
-            embed.add_field(
-                name="Features",
-                value="• AI Companions & VTuber interactions\n• Community posts & discussions\n• Real-time chat\n• User profiles & achievements\n• Plugin system",
-                inline=False
-            )
-            
-            embed.add_field(
-                name="Access",
-                value="Visit: http://localhost:8000\n*(Update this with your actual domain)*",
-                inline=False
-            )
-            
-            await ctx.send(embed=embed)
+            await ctx.send(embed=invite_embed)
         
         @self.bot.command(name="ai")
         async def ai_chat(ctx, *, message: str):
@@ -276,7 +292,7 @@ class DiscordBot:
             await self.bot.process_commands(message)
             
             # Handle mentions or AI keywords
-            if self.bot.user.mentioned_in(message) or any(keyword in message.content.lower() for keyword in ["ai", "assistant", "help"]):
+            if self.bot.user.mentioned_in(message) or ASSISTANT_KEYWORDS_RE.search(message.content):
                 if not message.content.startswith("!garvis"):
                     embed = discord.Embed(
                         title="🤖 GarvisNeuralMind Assistant",
@@ -308,9 +324,8 @@ class DiscordBot:
             return
         
         # Find notification channel
-        guild_id = self.settings.DISCORD_GUILD_ID
-        if guild_id:
-            guild = self.bot.get_guild(int(guild_id))
+        if self._guild_id:
+            guild = self.bot.get_guild(self._guild_id)
             if guild:
                 channel = discord.utils.get(guild.channels, name="community-updates")
                 if channel:
@@ -326,9 +341,8 @@ class DiscordBot:
         if not self.bot or not self._running:
             return
         
-        guild_id = self.settings.DISCORD_GUILD_ID
-        if guild_id:
-            guild = self.bot.get_guild(int(guild_id))
+        if self._guild_id:
+            guild = self.bot.get_guild(self._guild_id)
             if guild:
                 channel = discord.utils.get(guild.channels, name="community-updates")
                 if channel:
@@ -3,21 +3,59 @@ Community Manager - Core community operations and orchestration.
 """
 
 import asyncio
+import functools
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Set, Tuple
 
-from sqlalchemy import select, func
+import orjson
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import bindparam, select, func, update, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.database import (
     AsyncSessionLocal, User, Community, Post, Comment, 
-    cache_user_online_status, get_online_users, cache_community_stats
+    get_online_users, cache_communities_stats,
+    cache_global_stats, get_cached_global_stats, count_active_users, is_user_online,
+    prune_user_activity, ONLINE_WINDOW, cache_user_profile, get_cached_user_profile,
+    invalidate_user_profile, increment_post_vote, pop_post_vote_deltas, restore_post_vote_deltas,
+    publish_users_activity, consume_users_activity, prune_activity_consumers, publish_user_event,
+    publish_users_gone_offline
 )
 from src.core.config import get_settings, get_community_features
 
 logger = logging.getLogger(__name__)
 
+# Seconds between flushes of buffered per-request activity
+ACTIVITY_FLUSH_INTERVAL = 5
+
+# Activity stream entries applied to the online set per read
+ACTIVITY_STREAM_BATCH = 1000
+
+# Seconds between moves of Redis vote counters into the posts table
+VOTE_FLUSH_INTERVAL = 30
+
+# Seconds a rendered user profile is served from Redis
+USER_PROFILE_TTL = 120
+
+# Activity older than this drops out of "active today" and is pruned from Redis
+ACTIVE_TODAY_WINDOW = 24 * 60 * 60
+
+# Bulk membership imports of at least this many rows go through COPY
+BULK_COPY_THRESHOLD = 100
+
+# Seconds the site-wide COUNT(*) results are reused from Redis
+GLOBAL_STATS_TTL = 60
+
+# Seconds stop() waits for job runs in progress before cancelling them
+JOB_SHUTDOWN_TIMEOUT = 30
+
 
 class CommunityManager:
     """Manages community operations, user interactions, and social features."""
@@ -25,34 +63,102 @@ class CommunityManager:
     def __init__(self):
         self.settings = get_settings()
         self.features = get_community_features()
-        self.active_users: Dict[int, datetime] = {}
-        self.community_stats_cache: Dict[int, Dict] = {}
-        self._running = False
+        self.pending_activity: Dict[int, float] = {}
+        self._cpu_pool: Optional[ThreadPoolExecutor] = None
+        self.scheduler: Optional[AsyncIOScheduler] = None
+        self._job_tasks: Set[asyncio.Task] = set()
+        self._consumer_name = f"{socket.gethostname()}:{os.getpid()}"
         
     async def start(self):
         """Start the community manager."""
-        self._running = True
         logger.info("🚀 Community Manager started")
+        self._cpu_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="community-cpu")
         
-        # Start background tasks
-        asyncio.create_task(self._update_user_activity())
-        asyncio.create_task(self._update_community_stats())
-        asyncio.create_task(self._cleanup_inactive_users())
+        # Schedule background jobs; a run that overlaps the previous one is
+        # skipped and missed runs are coalesced into one. Jobs with long
+        # intervals also run once right away, as at startup nothing is cached yet.
+        self.scheduler = AsyncIOScheduler(
+            job_defaults={"max_instances": 1, "coalesce": True}
+        )
+        now = datetime.now()
+        self.scheduler.add_job(self._tracked(self._update_user_activity), "interval", seconds=60, next_run_time=now)
+        self.scheduler.add_job(self._tracked(self._flush_user_activity), "interval", seconds=ACTIVITY_FLUSH_INTERVAL)
+        self.scheduler.add_job(self._tracked(self._consume_user_activity), "interval", seconds=ACTIVITY_FLUSH_INTERVAL)
+        self.scheduler.add_job(self._tracked(self._update_community_stats), "interval", seconds=300, next_run_time=now)
+        self.scheduler.add_job(self._tracked(self._cleanup_inactive_users), "interval", seconds=600, next_run_time=now)
+        self.scheduler.add_job(self._tracked(self._flush_vote_counters), "interval", seconds=VOTE_FLUSH_INTERVAL)
+        self.scheduler.start()
         
     async def stop(self):
         """Stop the community manager."""
-        self._running = False
+        if self.scheduler:
+            # Shutting the scheduler down cancels job runs in progress, which
+            # would lose whatever a flush already took out of Redis and could
+            # leave a stats refresh using the CPU pool after it is closed
+            self.scheduler.pause()
+            while self._job_tasks:
+                _, pending = await asyncio.wait(set(self._job_tasks), timeout=JOB_SHUTDOWN_TIMEOUT)
+                if pending:
+                    logger.warning("%d community jobs still running at shutdown; cancelling", len(pending))
+                    break
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+        if self._cpu_pool:
+            self._cpu_pool.shutdown(wait=False)
+            self._cpu_pool = None
+        
+        # Don't lose activity buffered since the last scheduled flush
+        try:
+            await self._flush_user_activity()
+        except Exception as e:
+            logger.error("Error flushing user activity on shutdown: %s", e)
         logger.info("🛑 Community Manager stopped")
     
+    def _tracked(self, job: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+        """Wrap a scheduled job so stop() can wait for its runs in progress."""
+        @functools.wraps(job)
+        async def run():
+            task = asyncio.current_task()
+            self._job_tasks.add(task)
+            try:
+                await job()
+            finally:
+                self._job_tasks.discard(task)
+        
+        return run
+    
     # User Management
     
     async def register_user_activity(self, user_id: int):
         """Register user activity for online status tracking."""
-        self.active_users[user_id] = datetime.utcnow()
-        await cache_user_online_status(user_id, True)
+        await publish_users_activity({user_id: time.time()})
+    
+    def mark_user_active(self, user_id: int):
+        """Buffer user activity in memory; flushed in bulk by a background task."""
+        self.pending_activity[user_id] = time.time()
+    
+    async def register_bulk_activity(self, activity: Dict[int, float]):
+        """Register activity for many users at once (user id -> unix timestamp)."""
+        if not activity:
+            return
+        
+        await publish_users_activity(activity)
         
     async def get_user_profile(self, user_id: int) -> Optional[Dict]:
         """Get comprehensive user profile with community stats."""
+        # Online status is live; everything else may come from the cache
+        profile = await get_cached_user_profile(user_id)
+        if profile is None:
+            profile = await self._build_user_profile(user_id)
+            if profile is None:
+                return None
+            await cache_user_profile(user_id, profile, USER_PROFILE_TTL)
+        
+        profile["is_online"] = await is_user_online(user_id)
+        return profile
+    
+    async def _build_user_profile(self, user_id: int) -> Optional[Dict]:
+        """Load a user profile and its statistics from the database."""
         async with AsyncSessionLocal() as session:
             # Get user data
             result = await session.execute(
@@ -80,8 +186,7 @@ class CommunityManager:
                 "is_premium": user.is_premium,
                 "created_at": user.created_at.isoformat() if user.created_at else None,
                 "last_active_at": user.last_active_at.isoformat() if user.last_active_at else None,
-                "statistics": stats,
-                "is_online": user_id in self.active_users
+                "statistics": stats
             }
     
     async def update_user_profile(self, user_id: int, profile_data: Dict) -> bool:
@@ -103,7 +208,9 @@ class CommunityManager:
             
             user.updated_at = datetime.utcnow()
             await session.commit()
-            return True
+        
+        await invalidate_user_profile(user_id)
+        return True
     
     # Community Management
     
@@ -123,22 +230,30 @@ class CommunityManager:
             await session.commit()
             await session.refresh(community)
             
-            logger.info(f"📊 New community created: {community.name} by user {creator_id}")
+            logger.info("📊 New community created: %s by user %s", community.name, creator_id)
             return community.id
     
-    async def get_community_list(self, limit: int = 20, offset: int = 0) -> List[Dict]:
-        """Get list of public communities."""
+    async def get_community_list(self, limit: int = 20,
+                                 cursor: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        """Get a page of public communities.
+        
+        Pass the previous page's ``next_cursor`` as ``cursor`` to continue.
+        """
         async with AsyncSessionLocal() as session:
+            query = select(Community).where(Community.is_public == True)
+            
+            # Keyset pagination: seek past the last (member_count, id) seen
+            if cursor:
+                query = query.where(tuple_(Community.member_count, Community.id) < cursor)
+            
             result = await session.execute(
-                select(Community)
-                .where(Community.is_public == True)
-                .order_by(Community.member_count.desc())
+                query
+                .order_by(Community.member_count.desc(), Community.id.desc())
                 .limit(limit)
-                .offset(offset)
             )
             communities = result.scalars().all()
             
-            return [
+            items = [
                 {
                     "id": c.id,
                     "name": c.name,
@@ -151,45 +266,101 @@ class CommunityManager:
                 }
                 for c in communities
             ]
+            
+            last = communities[-1] if len(communities) == limit else None
+            return {
+                "items": items,
+                "next_cursor": (last.member_count, last.id) if last else None
+            }
     
     async def join_community(self, user_id: int, community_id: int) -> bool:
         """Add user to community."""
         async with AsyncSessionLocal() as session:
             from src.core.database import CommunityMember
             
-            # Check if already a member
-            existing = await session.execute(
-                select(CommunityMember)
-                .where(
-                    CommunityMember.user_id == user_id,
-                    CommunityMember.community_id == community_id
-                )
-            )
-            
-            if existing.scalar_one_or_none():
-                return False  # Already a member
-            
-            # Add membership
-            member = CommunityMember(
-                user_id=user_id,
-                community_id=community_id
+            # Bump the member count first; no row means no such community
+            result = await session.execute(
+                update(Community)
+                .where(Community.id == community_id)
+                .values(member_count=Community.member_count + 1)
             )
-            session.add(member)
+            if not result.rowcount:
+                return False
             
-            # Update community member count
+            # Add membership; the unique constraint decides if it already exists
             result = await session.execute(
-                select(Community).where(Community.id == community_id)
+                pg_insert(CommunityMember)
+                .values(user_id=user_id, community_id=community_id)
+                .on_conflict_do_nothing(index_elements=["user_id", "community_id"])
+                .returning(CommunityMember.id)
             )
-            community = result.scalar_one_or_none()
             
-            if community:
-                community.member_count += 1
-                await session.commit()
-                
-                logger.info(f"👥 User {user_id} joined community {community_id}")
-                return True
+            if result.first() is None:
+                await session.rollback()
+                return False  # Already a member
             
-            return False
+            await session.commit()
+            
+            logger.info("👥 User %s joined community %s", user_id, community_id)
+            return True
+    
+    async def bulk_join(self, pairs: List[Tuple[int, int]]) -> int:
+        """Add many (user_id, community_id) memberships at once.
+        
+        Returns the number of memberships actually created.
+        """
+        from src.core.database import CommunityMember
+        
+        pairs = list(set(pairs))
+        if not pairs:
+            return 0
+        
+        async with AsyncSessionLocal() as session:
+            if len(pairs) >= BULK_COPY_THRESHOLD:
+                # COPY can't skip duplicates, so stage the rows and let
+                # INSERT ... ON CONFLICT filter existing memberships
+                await session.execute(text(
+                    "CREATE TEMP TABLE tmp_community_members "
+                    "(user_id integer, community_id integer) ON COMMIT DROP"
+                ))
+                conn = await session.connection()
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_records_to_table(
+                    "tmp_community_members",
+                    records=pairs,
+                    columns=["user_id", "community_id"]
+                )
+                result = await session.execute(text(
+                    "INSERT INTO community_members (user_id, community_id, role) "
+                    "SELECT user_id, community_id, 'member' FROM tmp_community_members "
+                    "ON CONFLICT (user_id, community_id) DO NOTHING"
+                ))
+            else:
+                result = await session.execute(
+                    pg_insert(CommunityMember)
+                    .values([
+                        {"user_id": user_id, "community_id": community_id, "role": "member"}
+                        for user_id, community_id in pairs
+                    ])
+                    .on_conflict_do_nothing(index_elements=["user_id", "community_id"])
+                )
+            created = result.rowcount
+            
+            # Recount the touched communities rather than tracking per-row increments
+            community_ids = {community_id for _, community_id in pairs}
+            await session.execute(
+                update(Community)
+                .where(Community.id.in_(community_ids))
+                .values(member_count=(
+                    select(func.count(CommunityMember.id))
+                    .where(CommunityMember.community_id == Community.id)
+                    .scalar_subquery()
+                ))
+            )
+            await session.commit()
+        
+        logger.info("👥 Bulk join created %s memberships", created)
+        return created
     
     # Content Management
     
@@ -206,53 +377,76 @@ class CommunityManager:
             )
             
             session.add(post)
-            await session.commit()
-            await session.refresh(post)
             
-            # Award experience points to author
-            await self._award_experience(author_id, 10, "post_creation")
+            # Award experience points to author in the same transaction
+            new_level = await self._award_experience(session, author_id, 10, "post_creation")
+            await session.commit()
+            await invalidate_user_profile(author_id)
+            if new_level:
+                await self._publish_level_ups({author_id: new_level})
             
-            logger.info(f"📝 New post created: {post.title} by user {author_id}")
+            logger.info("📝 New post created: %s by user %s", post.title, author_id)
             return post.id
     
-    async def get_community_feed(self, community_id: Optional[int] = None, 
-                                limit: int = 20, offset: int = 0) -> List[Dict]:
-        """Get community feed posts."""
+    async def get_community_feed(self, community_id: Optional[int] = None, limit: int = 20,
+                                 cursor: Optional[Tuple[datetime, int]] = None) -> Dict[str, Any]:
+        """Get a page of community feed posts.
+        
+        Pass the previous page's ``next_cursor`` as ``cursor`` to continue.
+        """
         async with AsyncSessionLocal() as session:
-            query = select(Post).join(User, Post.author_id == User.id)
+            # Select only the columns the feed renders; no ORM objects are built
+            query = (
+                select(
+                    Post.id, Post.title, Post.content, Post.post_type,
+                    Post.upvotes, Post.downvotes, Post.comment_count, Post.tags,
+                    Post.created_at,
+                    User.id.label("author_id"), User.username, User.display_name,
+                    User.avatar_url, User.reputation_score
+                )
+                .join(User, Post.author_id == User.id)
+            )
             
             if community_id:
                 query = query.where(Post.community_id == community_id)
             
-            query = query.where(Post.is_deleted == False).order_by(Post.created_at.desc())
-            query = query.limit(limit).offset(offset)
+            # Keyset pagination: seek past the last (created_at, id) seen
+            if cursor:
+                query = query.where(tuple_(Post.created_at, Post.id) < cursor)
+            
+            query = query.where(Post.is_deleted == False)
+            query = query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit)
             
             result = await session.execute(query)
-            posts = result.scalars().all()
+            rows = result.all()
             
-            feed_items = []
-            for post in posts:
-                author = await session.get(User, post.author_id)
-                feed_items.append({
-                    "id": post.id,
-                    "title": post.title,
-                    "content": post.content,
-                    "post_type": post.post_type,
-                    "upvotes": post.upvotes,
-                    "downvotes": post.downvotes,
-                    "comment_count": post.comment_count,
-                    "tags": post.tags,
-                    "created_at": post.created_at.isoformat() if post.created_at else None,
+            items = [
+                {
+                    "id": row.id,
+                    "title": row.title,
+                    "content": row.content,
+                    "post_type": row.post_type,
+                    "upvotes": row.upvotes,
+                    "downvotes": row.downvotes,
+                    "comment_count": row.comment_count,
+                    "tags": row.tags,
+                    "created_at": row.created_at.isoformat() if row.created_at else None,
                     "author": {
-                        "id": author.id,
-                        "username": author.username,
-                        "display_name": author.display_name,
-                        "avatar_url": author.avatar_url,
-                        "reputation_score": author.reputation_score
-                    } if author else None
-                })
+                        "id": row.author_id,
+                        "username": row.username,
+                        "display_name": row.display_name,
+                        "avatar_url": row.avatar_url,
+                        "reputation_score": row.reputation_score
+                    }
+                }
+                for row in rows
+            ]
             
-            return feed_items
+            last = rows[-1] if len(rows) == limit else None
+            return {
+                "items": items,
+                "next_cursor": (last.created_at, last.id) if last else None
+            }
     
     # Engagement and Gamification
     
@@ -262,76 +456,109 @@ class CommunityManager:
             return False
         
         async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(Post).where(Post.id == post_id)
+            exists = await session.scalar(
+                select(Post.id).where(Post.id == post_id)
             )
-            post = result.scalar_one_or_none()
-            
-            if not post:
-                return False
-            
-            # Update vote count
-            if vote_type == 'upvote':
-                post.upvotes += 1
-                await self._award_experience(post.author_id, 5, "post_upvoted")
-            else:
-                post.downvotes += 1
-            
-            await session.commit()
-            return True
+        
+        if not exists:
+            return False
+        
+        # Counted in Redis; _flush_vote_counters applies the totals and the
+        # author's experience points in batches
+        await increment_post_vote(post_id, vote_type)
+        return True
     
-    async def _award_experience(self, user_id: int, points: int, reason: str):
-        """Award experience points to user."""
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(User).where(User.id == user_id)
+    async def _award_experience(self, session: AsyncSession, user_id: int,
+                                points: int, reason: str) -> Optional[int]:
+        """Award experience points to user (committed by the caller).
+        
+        Returns the new level if the user leveled up, otherwise None.
+        """
+        # Single atomic statement; the CTE locks the row and keeps its level
+        # from before the update, so concurrent awards can't overwrite each
+        # other or both report the same level up
+        previous = (
+            select(User.id, User.level)
+            .where(User.id == user_id)
+            .with_for_update()
+            .cte("previous")
+        )
+        result = await session.execute(
+            update(User)
+            .where(User.id == previous.c.id)
+            .values(
+                experience_points=User.experience_points + points,
+                level=func.greatest(User.level, (User.experience_points + points) // 100 + 1)
             )
-            user = result.scalar_one_or_none()
-            
-            if user:
-                user.experience_points += points
-                
-                # Check for level up
-                new_level = (user.experience_points // 100) + 1
-                if new_level > user.level:
-                    user.level = new_level
-                    logger.info(f"🎉 User {user_id} leveled up to level {new_level}!")
-                
-                await session.commit()
+            .returning(previous.c.level, User.level)
+        )
+        row = result.first()
+        
+        if row:
+            old_level, new_level = row
+            if new_level > old_level:
+                logger.info("🎉 User %s leveled up to level %s!", user_id, new_level)
+                return new_level
+        
+        return None
+    
+    async def _publish_level_ups(self, level_ups: Dict[int, int]):
+        """Announce committed level ups."""
+        for user_id, level in level_ups.items():
+            await publish_user_event({"type": "level_up", "user_id": user_id, "level": level})
     
     # Statistics and Analytics
     
     async def get_community_stats(self) -> Dict[str, Any]:
         """Get overall community statistics."""
-        async with AsyncSessionLocal() as session:
-            # User stats
-            total_users = await session.scalar(select(func.count(User.id)))
-            active_users_count = len(self.active_users)
-            
-            # Content stats
-            total_posts = await session.scalar(select(func.count(Post.id)))
-            total_comments = await session.scalar(select(func.count(Comment.id)))
-            total_communities = await session.scalar(select(func.count(Community.id)))
-            
-            return {
-                "users": {
-                    "total": total_users or 0,
-                    "online": active_users_count,
-                    "active_today": len([
-                        uid for uid, last_seen in self.active_users.items()
-                        if last_seen > datetime.utcnow() - timedelta(days=1)
-                    ])
-                },
-                "content": {
-                    "total_posts": total_posts or 0,
-                    "total_comments": total_comments or 0,
-                    "total_communities": total_communities or 0
-                },
-                "engagement": {
-                    "average_posts_per_user": (total_posts / max(total_users, 1)) if total_users else 0,
-                    "active_community_ratio": active_users_count / max(total_users, 1) if total_users else 0
-                }
+        counts = await get_cached_global_stats()
+        if counts is None:
+            counts = await self._count_global_content()
+            await cache_global_stats(counts, GLOBAL_STATS_TTL)
+        
+        total_users = counts["users"]
+        total_posts = counts["posts"]
+        total_comments = counts["comments"]
+        total_communities = counts["communities"]
+        active_users_count = await count_active_users(ONLINE_WINDOW)
+        active_today_count = await count_active_users(ACTIVE_TODAY_WINDOW)
+        
+        return {
+            "users": {
+                "total": total_users or 0,
+                "online": active_users_count,
+                "active_today": active_today_count
+            },
+            "content": {
+                "total_posts": total_posts or 0,
+                "total_comments": total_comments or 0,
+                "total_communities": total_communities or 0
+            },
+            "engagement": {
+                "average_posts_per_user": (total_posts / max(total_users, 1)) if total_users else 0,
+                "active_community_ratio": active_users_count / max(total_users, 1) if total_users else 0
             }
+        }
+    
+    async def _count_global_content(self) -> Dict[str, int]:
+        """Count users, posts, comments and communities in a single round trip."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(
+                    select(func.count(User.id)).scalar_subquery(),
+                    select(func.count(Post.id)).scalar_subquery(),
+                    select(func.count(Comment.id)).scalar_subquery(),
+                    select(func.count(Community.id)).scalar_subquery(),
+                )
+            )
+            users, posts, comments, communities = result.one()
+        
+        return {
+            "users": users or 0,
+            "posts": posts or 0,
+            "comments": comments or 0,
+            "communities": communities or 0
+        }
     
     async def _get_user_statistics(self, session: AsyncSession, user_id: int) -> Dict:
         """Get detailed user statistics."""
@@ -360,90 +587,149 @@ class CommunityManager:
         else:
             return "low"
     
-    # Background Tasks
+    # Background Tasks (scheduled from start())
     
     async def _update_user_activity(self):
-        """Background task to update user activity."""
-        while self._running:
-            try:
-                # Clean up inactive users (older than 5 minutes)
-                cutoff = datetime.utcnow() - timedelta(minutes=5)
-                inactive_users = [
-                    uid for uid, last_seen in self.active_users.items()
-                    if last_seen < cutoff
-                ]
-                
-                for user_id in inactive_users:
-                    del self.active_users[user_id]
-                    await cache_user_online_status(user_id, False)
-                
-                await asyncio.sleep(60)  # Run every minute
-                
-            except Exception as e:
-                logger.error(f"Error in user activity update: {e}")
-                await asyncio.sleep(60)
+        """Announce users who went offline and prune stale user activity."""
+        await publish_users_gone_offline()
+        
+        # Users past the online window stop counting as online on their
+        # own; only drop entries too old to count as active today
+        await prune_user_activity(ACTIVE_TODAY_WINDOW)
+        
+        # Every worker restart leaves its host:pid consumer behind
+        await prune_activity_consumers()
+    
+    async def _flush_user_activity(self):
+        """Flush buffered user activity."""
+        pending, self.pending_activity = self.pending_activity, {}
+        await self.register_bulk_activity(pending)
+    
+    async def _consume_user_activity(self):
+        """Drain the activity stream into the online set."""
+        while await consume_users_activity(self._consumer_name, ACTIVITY_STREAM_BATCH) >= ACTIVITY_STREAM_BATCH:
+            pass
     
     async def _update_community_stats(self):
-        """Background task to update community statistics."""
-        while self._running:
-            try:
-                # Update global stats
-                stats = await self.get_community_stats()
-                
-                # Cache individual community stats
-                async with AsyncSessionLocal() as session:
-                    result = await session.execute(select(Community.id))
-                    community_ids = [row[0] for row in result.fetchall()]
-                    
-                    for community_id in community_ids:
-                        community_stats = await self._get_community_specific_stats(community_id)
-                        await cache_community_stats(community_id, community_stats)
-                
-                await asyncio.sleep(300)  # Run every 5 minutes
-                
-            except Exception as e:
-                logger.error(f"Error in community stats update: {e}")
-                await asyncio.sleep(300)
+        """Refresh cached community statistics."""
+        # Update global stats
+        await self.get_community_stats()
+        
+        # Cache individual community stats; the DB work stays on the loop,
+        # building and encoding the payloads goes to the CPU pool
+        async with AsyncSessionLocal() as session:
+            counts = await self._get_all_community_counts(session)
+        
+        loop = asyncio.get_running_loop()
+        encoded_stats = await loop.run_in_executor(self._cpu_pool, _encode_community_stats, *counts)
+        
+        await cache_communities_stats(encoded_stats)
     
     async def _cleanup_inactive_users(self):
-        """Background task to clean up inactive users."""
-        while self._running:
-            try:
-                # Update last_active_at for active users
-                async with AsyncSessionLocal() as session:
-                    for user_id in list(self.active_users.keys()):
-                        result = await session.execute(
-                            select(User).where(User.id == user_id)
-                        )
-                        user = result.scalar_one_or_none()
-                        if user:
-                            user.last_active_at = datetime.utcnow()
-                    
-                    await session.commit()
+        """Persist last_active_at for currently online users."""
+        # Update last_active_at for active users in a single statement
+        user_ids = await get_online_users()
+        if user_ids:
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    update(User)
+                    .where(User.id.in_(user_ids))
+                    .values(last_active_at=func.now())
+                )
+                await session.commit()
+    
+    async def _flush_vote_counters(self):
+        """Apply pending Redis vote counts to posts and award author experience."""
+        deltas = await pop_post_vote_deltas()
+        if not deltas:
+            return
+        
+        posts = Post.__table__
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    update(posts)
+                    .where(posts.c.id == bindparam("post_id"))
+                    .values(
+                        upvotes=posts.c.upvotes + bindparam("up"),
+                        downvotes=posts.c.downvotes + bindparam("down")
+                    ),
+                    [
+                        {
+                            "post_id": post_id,
+                            "up": counts.get("upvote", 0),
+                            "down": counts.get("downvote", 0)
+                        }
+                        for post_id, counts in deltas.items()
+                    ]
+                )
+                
+                # Upvotes earn the author 5 points each
+                upvoted = {post_id: counts["upvote"] for post_id, counts in deltas.items() if counts.get("upvote")}
+                author_points: Dict[int, int] = {}
+                if upvoted:
+                    result = await session.execute(
+                        select(Post.id, Post.author_id).where(Post.id.in_(upvoted))
+                    )
+                    for post_id, author_id in result.all():
+                        author_points[author_id] = author_points.get(author_id, 0) + upvoted[post_id] * 5
                 
-                await asyncio.sleep(600)  # Run every 10 minutes
+                level_ups: Dict[int, int] = {}
+                for author_id, points in author_points.items():
+                    new_level = await self._award_experience(session, author_id, points, "post_upvoted")
+                    if new_level:
+                        level_ups[author_id] = new_level
                 
-            except Exception as e:
-                logger.error(f"Error in cleanup task: {e}")
-                await asyncio.sleep(600)
+                await session.commit()
+        except Exception:
+            await restore_post_vote_deltas(deltas)
+            raise
+        
+        for author_id in author_points:
+            await invalidate_user_profile(author_id)
+        await self._publish_level_ups(level_ups)
     
-    async def _get_community_specific_stats(self, community_id: int) -> Dict:
-        """Get statistics for a specific community."""
-        async with AsyncSessionLocal() as session:
-            from src.core.database import CommunityMember
-            
-            member_count = await session.scalar(
-                select(func.count(CommunityMember.id))
-                .where(CommunityMember.community_id == community_id)
-            )
-            
-            post_count = await session.scalar(
-                select(func.count(Post.id))
-                .where(Post.community_id == community_id)
-            )
-            
-            return {
-                "member_count": member_count or 0,
-                "post_count": post_count or 0,
-                "activity_score": (member_count or 0) + (post_count or 0) * 2
-            }
\ No newline at end of file
+    async def _get_all_community_counts(
+        self, session: AsyncSession
+    ) -> Tuple[List[int], Dict[int, int], Dict[int, int]]:
+        """Get community IDs with member and post counts using grouped queries."""
+        from src.core.database import CommunityMember
+        
+        result = await session.execute(select(Community.id))
+        community_ids = result.scalars().all()
+        
+        result = await session.execute(
+            select(CommunityMember.community_id, func.count(CommunityMember.id))
+            .group_by(CommunityMember.community_id)
+        )
+        member_counts = dict(result.all())
+        
+        result = await session.execute(
+            select(Post.community_id, func.count(Post.id))
+            .where(Post.community_id.is_not(None))
+            .group_by(Post.community_id)
+        )
+        post_counts = dict(result.all())
+        
+        return community_ids, member_counts, post_counts
+
+
+def _encode_community_stats(
+    community_ids: List[int], member_counts: Dict[int, int], post_counts: Dict[int, int]
+) -> Dict[int, bytes]:
+    """Build and JSON-encode per-community stats (runs on the CPU pool)."""
+    encoded = {}
+    for community_id in community_ids:
+        member_count = member_counts.get(community_id, 0)
+        post_count = post_counts.get(community_id, 0)
+        encoded[community_id] = orjson.dumps({
+            "member_count": member_count,
+            "post_count": post_count,
+            "activity_score": member_count + post_count * 2
+        })
+    
+    return encoded
+
+
+# Global instance
+community_manager = CommunityManager()
\ No newline at end of file
@@ -3,15 +3,43 @@ WebSocket Manager - Real-time communication for community features.
 """
 
 import asyncio
-import json
 import logging
 from datetime import datetime
-from typing import Dict, List, Set, Optional, Any
+from typing import Dict, List, Set, Optional, Any, Union
 
+import orjson
 from fastapi import WebSocket, WebSocketDisconnect
 
 logger = logging.getLogger(__name__)
 
+# Messages a client may have waiting before it is dropped as too slow, and how
+# long a single send may take
+OUTBOUND_QUEUE_SIZE = 64
+SEND_TIMEOUT = 5.0
+
+# Most queued messages coalesced into one frame. A lone message is sent as-is;
+# several go out together as a JSON array, which clients treat as a batch.
+MAX_BATCH_SIZE = 32
+
+# Close code sent to clients dropped for falling behind (policy violation)
+SLOW_CLIENT_CLOSE_CODE = 1008
+
+# Large fan-outs yield to the event loop after every chunk of this many recipients
+BROADCAST_CHUNK_SIZE = 50
+
+# Outgoing messages are dicts or already-encoded JSON text
+Message = Union[Dict[str, Any], str]
+
+
+def _encode(message: Message) -> str:
+    """Encode a message once; pre-encoded text passes through untouched.
+    
+    orjson writes datetimes as ISO 8601 itself, so messages carry them as-is.
+    """
+    if isinstance(message, str):
+        return message
+    return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+
 
 class WebSocketManager:
     """Manages WebSocket connections for real-time community features."""
@@ -26,6 +54,10 @@ class WebSocketManager:
         # User to rooms mapping: user_id -> Set[room_id]
         self.user_to_rooms: Dict[str, Set[str]] = {}
         
+        # Per-connection outbound queues, each drained by its own relay task
+        self.outbound: Dict[str, asyncio.Queue] = {}
+        self._relays: Dict[str, asyncio.Task] = {}
+        
         # Message handlers
         self.message_handlers = {
             "chat_message": self._handle_chat_message,
@@ -40,16 +72,19 @@ class WebSocketManager:
     async def connect(self, websocket: WebSocket, user_id: str):
         """Connect a user's WebSocket."""
         await websocket.accept()
+        self._stop_relay(user_id)
         self.active_connections[user_id] = websocket
         self.user_to_rooms[user_id] = set()
+        self.outbound[user_id] = asyncio.Queue(OUTBOUND_QUEUE_SIZE)
+        self._relays[user_id] = asyncio.create_task(self._relay(user_id, websocket))
         
-        logger.info(f"🔌 User {user_id} connected via WebSocket")
+        logger.info("🔌 User %s connected via WebSocket", user_id)
         
         # Send welcome message
         await self.send_personal_message(user_id, {
             "type": "connection_established",
             "message": "Welcome to GarvisNeuralMind Community!",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "user_id": user_id
         })
         
@@ -57,11 +92,18 @@ class WebSocketManager:
         await self.broadcast_to_all({
             "type": "user_online",
             "user_id": user_id,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
     
-    def disconnect(self, user_id: str):
-        """Disconnect a user's WebSocket."""
+    def disconnect(self, user_id: str, websocket: Optional[WebSocket] = None):
+        """Disconnect a user's WebSocket.
+        
+        When ``websocket`` is given, nothing happens if the user has since
+        reconnected on a different socket.
+        """
+        if websocket is not None and self.active_connections.get(user_id) is not websocket:
+            return
+        
         if user_id in self.active_connections:
             # Remove from all rooms
             for room_id in list(self.user_to_rooms.get(user_id, [])):
@@ -71,69 +113,120 @@ class WebSocketManager:
             del self.active_connections[user_id]
             if user_id in self.user_to_rooms:
                 del self.user_to_rooms[user_id]
+            self._stop_relay(user_id)
             
-            logger.info(f"🔌 User {user_id} disconnected")
+            logger.info("🔌 User %s disconnected", user_id)
             
             # Notify offline status change
             asyncio.create_task(self.broadcast_to_all({
                 "type": "user_offline",
                 "user_id": user_id,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.utcnow()
             }))
     
-    async def send_personal_message(self, user_id: str, message: Dict[str, Any]):
+    async def send_personal_message(self, user_id: str, message: Message):
         """Send a message to a specific user."""
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_text(json.dumps(message))
-            except WebSocketDisconnect:
-                self.disconnect(user_id)
-            except Exception as e:
-                logger.error(f"Error sending message to {user_id}: {e}")
-                self.disconnect(user_id)
+        self._enqueue(user_id, _encode(message))
     
-    async def broadcast_to_room(self, room_id: str, message: Dict[str, Any], 
+    async def broadcast_to_room(self, room_id: str, message: Message, 
                                exclude_user: Optional[str] = None):
         """Broadcast a message to all users in a room."""
         if room_id not in self.user_rooms:
             return
         
-        disconnected_users = []
-        
-        for user_id in self.user_rooms[room_id]:
-            if exclude_user and user_id == exclude_user:
-                continue
-            
-            if user_id in self.active_connections:
-                try:
-                    await self.active_connections[user_id].send_text(json.dumps(message))
-                except (WebSocketDisconnect, Exception):
-                    disconnected_users.append(user_id)
-        
-        # Clean up disconnected users
-        for user_id in disconnected_users:
-            self.disconnect(user_id)
+        user_ids = [
+            user_id for user_id in self.user_rooms[room_id]
+            if not (exclude_user and user_id == exclude_user)
+        ]
+        await self._send_to_users(user_ids, message)
     
-    async def broadcast_to_all(self, message: Dict[str, Any], 
+    async def broadcast_to_all(self, message: Message, 
                               exclude_user: Optional[str] = None):
         """Broadcast a message to all connected users."""
-        disconnected_users = []
+        user_ids = [
+            user_id for user_id in self.active_connections
+            if not (exclude_user and user_id == exclude_user)
+        ]
+        await self._send_to_users(user_ids, message)
+    
+    async def _send_to_users(self, user_ids: List[str], message: Message):
+        """Queue a message for many users."""
+        payload = _encode(message)
+        if len(user_ids) <= BROADCAST_CHUNK_SIZE:
+            for user_id in user_ids:
+                self._enqueue(user_id, payload)
+            return
         
-        for user_id, websocket in self.active_connections.items():
-            if exclude_user and user_id == exclude_user:
-                continue
-            
-            try:
-                await websocket.send_text(json.dumps(message))
-            except (WebSocketDisconnect, Exception):
-                disconnected_users.append(user_id)
+        # Let request handlers and relays run between chunks of a big fan-out
+        for start in range(0, len(user_ids), BROADCAST_CHUNK_SIZE):
+            for user_id in user_ids[start:start + BROADCAST_CHUNK_SIZE]:
+                self._enqueue(user_id, payload)
+            await asyncio.sleep(0)
+    
+    def _enqueue(self, user_id: str, payload: str):
+        """Queue encoded text for a user; clients that fall too far behind are dropped."""
+        queue = self.outbound.get(user_id)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self._drop(user_id, "outbound queue full")
+    
+    async def _relay(self, user_id: str, websocket: WebSocket):
+        """Write queued messages to one client's socket, batching any backlog."""
+        queue = self.outbound[user_id]
+        try:
+            # _stop_relay detaches the queue as well as cancelling the task;
+            # before Python 3.12, wait_for can swallow a cancel that lands
+            # just as the send completes
+            while self.outbound.get(user_id) is queue:
+                batch = [await queue.get()]
+                while len(batch) < MAX_BATCH_SIZE and not queue.empty():
+                    batch.append(queue.get_nowait())
+                
+                payload = batch[0] if len(batch) == 1 else "[" + ",".join(batch) + "]"
+                await asyncio.wait_for(websocket.send_text(payload), timeout=SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except WebSocketDisconnect:
+            self.disconnect(user_id, websocket)
+        except Exception as e:
+            # Includes send timeouts, which may leave a partial frame behind
+            self._drop(user_id, f"send failed: {e!r}", websocket)
+    
+    def _drop(self, user_id: str, reason: str, websocket: Optional[WebSocket] = None):
+        """Disconnect a misbehaving client and close its socket so it can reconnect."""
+        websocket = websocket or self.active_connections.get(user_id)
+        if websocket is None or self.active_connections.get(user_id) is not websocket:
+            return
         
-        # Clean up disconnected users
-        for user_id in disconnected_users:
-            self.disconnect(user_id)
+        logger.warning("🔌 Dropping user %s: %s", user_id, reason)
+        self.disconnect(user_id, websocket)
+        # Closing ends the endpoint's receive loop as well
+        asyncio.create_task(self._close(websocket))
+    
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        """Close a socket, ignoring clients that are already gone."""
+        try:
+            await websocket.close(code=SLOW_CLIENT_CLOSE_CODE)
+        except Exception:
+            pass
+    
+    def _stop_relay(self, user_id: str):
+        """Stop a user's relay task and discard anything still queued."""
+        self.outbound.pop(user_id, None)
+        relay = self._relays.pop(user_id, None)
+        if relay and relay is not asyncio.current_task():
+            relay.cancel()
     
     async def handle_message(self, user_id: str, data: Dict[str, Any]):
         """Handle incoming WebSocket message."""
+        # Messages still arriving from a dropped client are ignored
+        if user_id not in self.active_connections:
+            return
+        
         message_type = data.get("type")
         
         if message_type in self.message_handlers:
@@ -144,14 +237,14 @@ class WebSocketManager:
                 await self.send_personal_message(user_id, {
                     "type": "error",
                     "message": f"Error processing {message_type}",
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": datetime.utcnow()
                 })
         else:
             logger.warning(f"Unknown message type: {message_type} from user {user_id}")
             await self.send_personal_message(user_id, {
                 "type": "error",
                 "message": f"Unknown message type: {message_type}",
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.utcnow()
             })
     
     # Message Handlers
@@ -166,7 +259,7 @@ class WebSocketManager:
             await self.send_personal_message(user_id, {
                 "type": "error",
                 "message": "Room ID and content are required",
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.utcnow()
             })
             return
         
@@ -175,25 +268,26 @@ class WebSocketManager:
             await self.send_personal_message(user_id, {
                 "type": "error",
                 "message": "You are not in this room",
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.utcnow()
             })
             return
         
         # Create message object
+        now = datetime.utcnow()
         message = {
             "type": "chat_message",
             "room_id": room_id,
             "user_id": user_id,
             "content": content,
             "message_type": message_type,
-            "timestamp": datetime.utcnow().isoformat(),
-            "message_id": f"{user_id}_{datetime.utcnow().timestamp()}"
+            "timestamp": now,
+            "message_id": f"{user_id}_{now.timestamp()}"
         }
         
         # Broadcast to room
         await self.broadcast_to_room(room_id, message)
         
-        logger.info(f"💬 Chat message from {user_id} in room {room_id}")
+        logger.info("💬 Chat message from %s in room %s", user_id, room_id)
     
     async def _handle_join_room(self, user_id: str, data: Dict[str, Any]):
         """Handle user joining a room."""
@@ -204,7 +298,7 @@ class WebSocketManager:
             await self.send_personal_message(user_id, {
                 "type": "error",
                 "message": "Room ID is required",
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.utcnow()
             })
             return
         
@@ -220,7 +314,7 @@ class WebSocketManager:
             "type": "room_joined",
             "room_id": room_id,
             "room_type": room_type,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
         
         # Notify others in room
@@ -228,10 +322,10 @@ class WebSocketManager:
             "type": "user_joined_room",
             "room_id": room_id,
             "user_id": user_id,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }, exclude_user=user_id)
         
-        logger.info(f"🏠 User {user_id} joined room {room_id}")
+        logger.info("🏠 User %s joined room %s", user_id, room_id)
     
     async def _handle_leave_room(self, user_id: str, data: Dict[str, Any]):
         """Handle user leaving a room."""
@@ -246,7 +340,7 @@ class WebSocketManager:
         await self.send_personal_message(user_id, {
             "type": "room_left",
             "room_id": room_id,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
         
         # Notify others in room
@@ -254,10 +348,10 @@ class WebSocketManager:
             "type": "user_left_room",
             "room_id": room_id,
             "user_id": user_id,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
         
-        logger.info(f"🏠 User {user_id} left room {room_id}")
+        logger.info("🏠 User %s left room %s", user_id, room_id)
     
     async def _handle_typing_indicator(self, user_id: str, data: Dict[str, Any]):
         """Handle typing indicator."""
@@ -273,7 +367,7 @@ class WebSocketManager:
             "room_id": room_id,
             "user_id": user_id,
             "is_typing": is_typing,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }, exclude_user=user_id)
     
     async def _handle_user_status(self, user_id: str, data: Dict[str, Any]):
@@ -290,10 +384,10 @@ class WebSocketManager:
             "user_id": user_id,
             "status": status,
             "custom_message": custom_message,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }, exclude_user=user_id)
         
-        logger.info(f"📊 User {user_id} status updated to {status}")
+        logger.info("📊 User %s status updated to %s", user_id, status)
     
     async def _handle_community_update(self, user_id: str, data: Dict[str, Any]):
         """Handle community update notifications."""
@@ -311,7 +405,7 @@ class WebSocketManager:
             "update_type": update_type,
             "user_id": user_id,
             "data": data.get("update_data", {}),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
     
     async def _handle_post_update(self, user_id: str, data: Dict[str, Any]):
@@ -329,9 +423,14 @@ class WebSocketManager:
             "update_type": update_type,
             "user_id": user_id,
             "data": data.get("update_data", {}),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
     
+    async def handle_user_event(self, event: Dict[str, Any]):
+        """Deliver a user event published by the community manager."""
+        if event.get("type") == "level_up":
+            await self.notify_user_level_up(str(event["user_id"]), event["level"])
+    
     def _remove_user_from_room(self, user_id: str, room_id: str):
         """Remove user from a specific room."""
         if room_id in self.user_rooms and user_id in self.user_rooms[room_id]:
@@ -369,7 +468,7 @@ class WebSocketManager:
             "type": "new_post",
             "community_id": community_id,
             "post": post_data,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
     
     async def notify_new_comment(self, post_id: int, comment_data: Dict[str, Any]):
@@ -378,7 +477,7 @@ class WebSocketManager:
             "type": "new_comment",
             "post_id": post_id,
             "comment": comment_data,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
     
     async def notify_user_level_up(self, user_id: str, new_level: int):
@@ -387,15 +486,16 @@ class WebSocketManager:
             "type": "level_up",
             "new_level": new_level,
             "message": f"Congratulations! You reached level {new_level}!",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
         
-        # Also broadcast to user's communities
-        for room_id in self.user_to_rooms.get(user_id, set()):
-            await self.broadcast_to_room(room_id, {
-                "type": "user_achievement",
-                "user_id": user_id,
-                "achievement_type": "level_up",
-                "new_level": new_level,
-                "timestamp": datetime.utcnow().isoformat()
-            }, exclude_user=user_id)
\ No newline at end of file
+        # Also broadcast to user's communities (same payload for every room)
+        achievement = _encode({
+            "type": "user_achievement",
+            "user_id": user_id,
+            "achievement_type": "level_up",
+            "new_level": new_level,
+            "timestamp": datetime.utcnow()
+        })
+        for room_id in list(self.user_to_rooms.get(user_id, set())):
+            await self.broadcast_to_room(room_id, achievement, exclude_user=user_id)
\ No newline at end of file
@@ -3,13 +3,17 @@ Database configuration and models for GarvisNeuralMind Community System.
 """
 
 import asyncio
+import time
 from datetime import datetime
-from typing import Optional, List
+from typing import AsyncIterator, Dict, Optional, List
+
+import orjson
 
 from sqlalchemy import (
     Boolean, Column, Integer, String, Text, DateTime, ForeignKey, 
-    JSON, Float, UniqueConstraint, Index, create_engine
+    JSON, Float, UniqueConstraint, Index, create_engine, text
 )
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from sqlalchemy.sql import func
@@ -22,11 +26,23 @@ Base = declarative_base()
 
 # Async engine and session
 settings = get_settings()
+# Always use asyncpg, whatever driver (or postgres:// alias) the URL names
+DATABASE_URL = make_url(
+    settings.DATABASE_URL.replace("postgres://", "postgresql://", 1)
+).set(drivername="postgresql+asyncpg")
 async_engine = create_async_engine(
-    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
+    DATABASE_URL,
     echo=settings.DEBUG,
-    pool_size=20,
-    max_overflow=0
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    # PgBouncer in transaction mode cannot keep prepared statements per connection
+    connect_args=(
+        {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        if settings.DB_PGBOUNCER else {}
+    )
 )
 
 AsyncSessionLocal = async_sessionmaker(
@@ -105,6 +121,12 @@ class Community(Base):
     creator = relationship("User")
     posts = relationship("Post", back_populates="community")
     members = relationship("CommunityMember", back_populates="community")
+    
+    # Indexes for community queries
+    __table_args__ = (
+        Index('ix_communities_public_listing', 'member_count', 'id',
+              postgresql_where=text('is_public')),
+    )
 
 
 class CommunityMember(Base):
@@ -161,6 +183,15 @@ class Post(Base):
     author = relationship("User", back_populates="posts")
     community = relationship("Community", back_populates="posts")
     comments = relationship("Comment", back_populates="post")
+    
+    # Indexes for feed and statistics queries
+    __table_args__ = (
+        Index('ix_posts_community_feed', 'community_id', 'created_at', 'id',
+              postgresql_where=text('NOT is_deleted')),
+        Index('ix_posts_feed', 'created_at', 'id',
+              postgresql_where=text('NOT is_deleted')),
+        Index('ix_posts_author_id', 'author_id'),
+    )
 
 
 class Comment(Base):
@@ -190,6 +221,11 @@ class Comment(Base):
     author = relationship("User", back_populates="comments")
     post = relationship("Post", back_populates="comments")
     parent = relationship("Comment", remote_side=[id])
+    
+    # Indexes for statistics queries
+    __table_args__ = (
+        Index('ix_comments_author_id', 'author_id'),
+    )
 
 
 class Message(Base):
@@ -255,8 +291,8 @@ class AICompanion(Base):
 
 # Database management functions
 
-async def get_db() -> AsyncSession:
-    """Get database session."""
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """Get a request-scoped database session (FastAPI dependency)."""
     async with AsyncSessionLocal() as session:
         try:
             yield session
@@ -294,31 +330,264 @@ async def create_initial_data():
 
 
 # Redis operations for caching and real-time features
+# (ZADD GT, ZMSCORE and XAUTOCLAIM below need Redis >= 6.2)
 
-async def cache_user_online_status(user_id: int, is_online: bool):
-    """Cache user online status in Redis."""
-    await redis_client.set(f"user:{user_id}:online", int(is_online), ex=300)  # 5 min expiry
+# Sorted set of user IDs scored by last activity (unix time), shared by all workers
+ONLINE_USERS_KEY = "users:online"
+ONLINE_WINDOW = 300  # seconds of inactivity before a user counts as offline
 
 
 async def get_online_users() -> List[int]:
     """Get list of online user IDs."""
-    pattern = "user:*:online"
-    keys = await redis_client.keys(pattern)
-    online_users = []
-    
-    for key in keys:
-        value = await redis_client.get(key)
-        if value and int(value) == 1:
-            user_id = int(key.decode().split(':')[1])
-            online_users.append(user_id)
-    
-    return online_users
-
-
-async def cache_community_stats(community_id: int, stats: dict):
-    """Cache community statistics."""
-    await redis_client.set(
-        f"community:{community_id}:stats", 
-        str(stats), 
-        ex=3600  # 1 hour expiry
-    )
\ No newline at end of file
+    cutoff = time.time() - ONLINE_WINDOW
+    members = await redis_client.zrangebyscore(ONLINE_USERS_KEY, cutoff, "+inf")
+    return [int(member) for member in members]
+
+
+# Activity is appended to a stream and applied to the online set by a consumer
+# group, so request handlers only pay for an XADD
+ACTIVITY_STREAM_KEY = "user:activity"
+ACTIVITY_STREAM_GROUP = "presence"
+ACTIVITY_STREAM_MAXLEN = 100_000
+# Entries read but left unacknowledged this long (consumer died, batch failed)
+# are claimed by the next consumer to poll
+ACTIVITY_CLAIM_IDLE_MS = 60_000
+# Consumers idle this long with nothing pending are removed from the group
+ACTIVITY_CONSUMER_STALE_MS = 600_000
+USER_EVENTS_CHANNEL = "user:events"
+OFFLINE_CHECKED_KEY = "users:online:offline_checked"
+
+
+async def publish_users_activity(activity: Dict[int, float]):
+    """Append activity (user id -> unix timestamp when seen) to the activity stream."""
+    if not activity:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for user_id, seen_at in activity.items():
+            pipe.xadd(
+                ACTIVITY_STREAM_KEY, {"uid": user_id, "ts": seen_at},
+                maxlen=ACTIVITY_STREAM_MAXLEN, approximate=True
+            )
+        await pipe.execute()
+
+
+async def consume_users_activity(consumer: str, count: int = 1000) -> int:
+    """Apply a batch of streamed activity to the online set.
+    
+    Idle entries another consumer never acknowledged are reclaimed before new
+    ones are read. Users that were not online before get a "user_online"
+    event published. Returns the number of stream entries processed.
+    """
+    try:
+        claimed = await redis_client.xautoclaim(
+            ACTIVITY_STREAM_KEY, ACTIVITY_STREAM_GROUP, consumer,
+            ACTIVITY_CLAIM_IDLE_MS, count=count
+        )
+        # Entries trimmed from the stream while pending come back empty
+        entries = [(entry_id, fields) for entry_id, fields in claimed[1] if fields]
+        if len(entries) < count:
+            response = await redis_client.xreadgroup(
+                ACTIVITY_STREAM_GROUP, consumer, {ACTIVITY_STREAM_KEY: ">"},
+                count=count - len(entries)
+            )
+            if response:
+                entries.extend(response[0][1])
+    except redis.ResponseError as e:
+        if "NOGROUP" not in str(e):
+            raise
+        try:
+            await redis_client.xgroup_create(
+                ACTIVITY_STREAM_KEY, ACTIVITY_STREAM_GROUP, id="0", mkstream=True
+            )
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        return 0
+    
+    if not entries:
+        return 0
+    
+    last_seen: Dict[int, float] = {}
+    for _, fields in entries:
+        user_id = int(fields[b"uid"])
+        last_seen[user_id] = max(last_seen.get(user_id, 0.0), float(fields[b"ts"]))
+    
+    user_ids = list(last_seen)
+    previous = await redis_client.zmscore(ONLINE_USERS_KEY, user_ids)
+    cutoff = time.time() - ONLINE_WINDOW
+    
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zadd(ONLINE_USERS_KEY, last_seen, gt=True)
+        pipe.xack(ACTIVITY_STREAM_KEY, ACTIVITY_STREAM_GROUP, *(entry_id for entry_id, _ in entries))
+        for user_id, score in zip(user_ids, previous):
+            if score is None or score < cutoff:
+                pipe.publish(USER_EVENTS_CHANNEL, orjson.dumps({"type": "user_online", "user_id": user_id}))
+        await pipe.execute()
+    
+    return len(entries)
+
+
+async def prune_activity_consumers() -> int:
+    """Remove consumers that stopped workers left in the activity group.
+    
+    Only consumers with nothing pending are removed; a dead consumer's pending
+    entries are reclaimed by live ones first. Returns the number removed.
+    """
+    try:
+        consumers = await redis_client.xinfo_consumers(ACTIVITY_STREAM_KEY, ACTIVITY_STREAM_GROUP)
+    except redis.ResponseError:
+        # No stream or group yet
+        return 0
+    
+    stale = [
+        consumer["name"] for consumer in consumers
+        if consumer["pending"] == 0 and consumer["idle"] >= ACTIVITY_CONSUMER_STALE_MS
+    ]
+    for name in stale:
+        await redis_client.xgroup_delconsumer(ACTIVITY_STREAM_KEY, ACTIVITY_STREAM_GROUP, name)
+    return len(stale)
+
+
+async def publish_users_gone_offline() -> List[int]:
+    """Publish "user_offline" for users whose activity left the online window.
+    
+    Each call covers the scores between the previous call's cutoff and now
+    minus ONLINE_WINDOW. The cutoff is swapped atomically, so concurrent
+    workers never announce the same user twice.
+    """
+    cutoff = time.time() - ONLINE_WINDOW
+    previous = await redis_client.getset(OFFLINE_CHECKED_KEY, cutoff)
+    if previous is None:
+        return []
+    
+    members = await redis_client.zrangebyscore(ONLINE_USERS_KEY, f"({float(previous)}", cutoff)
+    user_ids = [int(member) for member in members]
+    if user_ids:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.publish(USER_EVENTS_CHANNEL, orjson.dumps({"type": "user_offline", "user_id": user_id}))
+            await pipe.execute()
+    return user_ids
+
+
+async def publish_user_event(event: dict):
+    """Publish a user event (e.g. level up) to subscribers."""
+    await redis_client.publish(USER_EVENTS_CHANNEL, orjson.dumps(event))
+
+
+async def iter_user_events() -> AsyncIterator[dict]:
+    """Yield events published on the user events channel."""
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(USER_EVENTS_CHANNEL)
+    try:
+        async for message in pubsub.listen():
+            if message["type"] == "message":
+                yield orjson.loads(message["data"])
+    finally:
+        await pubsub.unsubscribe(USER_EVENTS_CHANNEL)
+        await pubsub.close()
+
+
+async def count_active_users(window: float) -> int:
+    """Count users seen within the last `window` seconds."""
+    return await redis_client.zcount(ONLINE_USERS_KEY, time.time() - window, "+inf")
+
+
+async def is_user_online(user_id: int) -> bool:
+    """Check whether a user was active within the online window."""
+    last_seen = await redis_client.zscore(ONLINE_USERS_KEY, user_id)
+    return last_seen is not None and last_seen >= time.time() - ONLINE_WINDOW
+
+
+async def prune_user_activity(max_age: float):
+    """Forget users whose last activity is older than `max_age` seconds."""
+    await redis_client.zremrangebyscore(ONLINE_USERS_KEY, "-inf", time.time() - max_age)
+
+
+async def cache_communities_stats(payloads: Dict[int, bytes]):
+    """Cache JSON-encoded statistics for many communities in one pipelined round trip."""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for community_id, payload in payloads.items():
+            pipe.set(f"community:{community_id}:stats", payload, ex=3600)  # 1 hour expiry
+        await pipe.execute()
+
+
+async def cache_global_stats(stats: dict, ttl: int = 60):
+    """Cache site-wide content counts."""
+    await redis_client.set("community:global_stats", orjson.dumps(stats), ex=ttl)
+
+
+async def get_cached_global_stats() -> Optional[dict]:
+    """Get cached site-wide content counts, if still fresh."""
+    cached = await redis_client.get("community:global_stats")
+    return orjson.loads(cached) if cached else None
+
+
+async def cache_user_profile(user_id: int, profile: dict, ttl: int = 120):
+    """Cache a rendered user profile."""
+    await redis_client.set(f"user:profile:{user_id}", orjson.dumps(profile), ex=ttl)
+
+
+async def get_cached_user_profile(user_id: int) -> Optional[dict]:
+    """Get a cached user profile, if still fresh."""
+    cached = await redis_client.get(f"user:profile:{user_id}")
+    return orjson.loads(cached) if cached else None
+
+
+async def invalidate_user_profile(user_id: int):
+    """Drop a cached user profile after the underlying data changed."""
+    await redis_client.delete(f"user:profile:{user_id}")
+
+
+async def revoke_token_digest(digest: str, ttl: int):
+    """Mark an access token (by digest) revoked until it would have expired anyway."""
+    await redis_client.set(f"auth:revoked:{digest}", 1, ex=ttl)
+
+
+async def is_token_digest_revoked(digest: str) -> bool:
+    """Check whether an access token (by digest) has been revoked."""
+    return bool(await redis_client.exists(f"auth:revoked:{digest}"))
+
+
+# Vote counters: votes land in post:{id}:votes hashes and the post ID in a
+# dirty set; a background job moves the totals into Postgres
+DIRTY_VOTES_KEY = "posts:votes:dirty"
+
+
+async def increment_post_vote(post_id: int, vote_type: str):
+    """Count a vote in Redis without touching the posts row."""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hincrby(f"post:{post_id}:votes", vote_type, 1)
+        pipe.sadd(DIRTY_VOTES_KEY, post_id)
+        await pipe.execute()
+
+
+async def pop_post_vote_deltas(max_posts: int = 1000) -> Dict[int, Dict[str, int]]:
+    """Take pending vote counts for up to max_posts posts out of Redis."""
+    post_ids = await redis_client.spop(DIRTY_VOTES_KEY, max_posts)
+    if not post_ids:
+        return {}
+    
+    # HGETALL + DEL per hash in one transaction so no vote falls in between
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for post_id in post_ids:
+            key = f"post:{int(post_id)}:votes"
+            pipe.hgetall(key)
+            pipe.delete(key)
+        results = await pipe.execute()
+    
+    deltas = {}
+    for post_id, counts in zip(post_ids, results[::2]):
+        if counts:
+            deltas[int(post_id)] = {field.decode(): int(value) for field, value in counts.items()}
+    return deltas
+
+
+async def restore_post_vote_deltas(deltas: Dict[int, Dict[str, int]]):
+    """Put vote counts back after a failed flush."""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for post_id, counts in deltas.items():
+            for vote_type, count in counts.items():
+                pipe.hincrby(f"post:{post_id}:votes", vote_type, count)
+            pipe.sadd(DIRTY_VOTES_KEY, post_id)
+        await pipe.execute()
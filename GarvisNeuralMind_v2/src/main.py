@@ -4,20 +4,33 @@ Main application entry point with FastAPI and community features.
 """
 
 import asyncio
+import hashlib
 import logging
-from contextlib import asynccontextmanager
+import sys
+import time
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
+from typing import Any, Dict
 
+import orjson
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = sys.platform != "win32"
+except ImportError:
+    UVLOOP_AVAILABLE = False
+    uvloop = None
+
 from src.core.config import get_settings
-from src.core.database import init_db
+from src.core.database import init_db, iter_user_events
 from src.api.v1.router import api_router
-from src.community.manager import CommunityManager
+from src.community.manager import community_manager
 from src.community.websocket import WebSocketManager
 from src.community.discord_bot import DiscordBot
 
@@ -30,22 +43,46 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Global managers
-community_manager = CommunityManager()
 websocket_manager = WebSocketManager()
 discord_bot = DiscordBot()
 
 
+async def forward_user_events():
+    """Relay community user events (level ups) to this worker's WebSocket clients."""
+    while True:
+        try:
+            async for event in iter_user_events():
+                await websocket_manager.handle_user_event(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Error in user event relay: %s", e)
+            await asyncio.sleep(5)
+
+
+# Health payloads are reused for this many seconds to coalesce monitor polls
+HEALTH_CACHE_TTL = 2.0
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     logger.info("🚀 Starting GarvisNeuralMind Community System...")
     
+    # uvloop is picked up by uvicorn's "auto" loop or installed in __main__;
+    # make it visible when a deployment falls back to the stock loop
+    loop = asyncio.get_running_loop()
+    logger.info("🔁 Event loop: %s.%s", type(loop).__module__, type(loop).__qualname__)
+    if UVLOOP_AVAILABLE and not isinstance(loop, uvloop.Loop):
+        logger.warning("uvloop is installed but not in use; start uvicorn with --loop uvloop")
+    
     # Initialize database
     await init_db()
     logger.info("✅ Database initialized")
     
     # Start community manager
     await community_manager.start()
+    user_events_task = asyncio.create_task(forward_user_events())
     logger.info("✅ Community manager started")
     
     # Start Discord bot (if enabled)
@@ -60,11 +97,31 @@ async def lifespan(app: FastAPI):
     
     # Cleanup
     logger.info("🛑 Shutting down GarvisNeuralMind...")
+    user_events_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await user_events_task
     await community_manager.stop()
     await discord_bot.stop()
     logger.info("✅ Graceful shutdown completed")
 
 
+def cached_json_response(request: Request, payload: Dict[str, Any], max_age: int) -> Response:
+    """Serialize a payload with ETag/Cache-Control headers, answering 304 on a match."""
+    body = orjson.dumps(payload)
+    # Weak validator: GZipMiddleware may re-encode the body after this, so the
+    # tag vouches for the content, not the exact bytes sent
+    opaque_tag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"Cache-Control": f"max-age={max_age}", "ETag": f"W/{opaque_tag}"}
+    
+    # If-None-Match uses weak comparison and may list several tags
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or any(
+        tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application."""
     settings = get_settings()
@@ -76,7 +133,8 @@ def create_app() -> FastAPI:
         docs_url="/docs",
         redoc_url="/redoc",
         lifespan=lifespan,
-        debug=settings.DEBUG
+        debug=settings.DEBUG,
+        default_response_class=ORJSONResponse
     )
     
     # Add middleware
@@ -87,7 +145,7 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
-    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
     
     # Include API routes
     app.include_router(api_router, prefix="/api/v1")
@@ -95,7 +153,7 @@ def create_app() -> FastAPI:
     # Static files for community UI
     static_path = Path(__file__).parent.parent / "static"
     if static_path.exists():
-        app.mount("/static", StaticFiles(directory=static_path), name="static")
+        app.mount("/static", StaticFiles(directory=static_path, check_dir=False), name="static")
     
     # WebSocket endpoint for real-time community features
     @app.websocket("/ws/community/{user_id}")
@@ -107,27 +165,49 @@ def create_app() -> FastAPI:
                 data = await websocket.receive_json()
                 await websocket_manager.handle_message(user_id, data)
         except WebSocketDisconnect:
-            websocket_manager.disconnect(user_id)
+            websocket_manager.disconnect(user_id, websocket)
     
     # Health check
+    # The lock is created on first use: create_app() runs at import, and on
+    # Python < 3.10 a Lock binds to the loop current at construction
+    health_cache: Dict[str, Any] = {"payload": None, "timestamp": 0.0, "lock": None}
+    
+    async def _get_health_payload() -> Dict[str, Any]:
+        """Build the health payload at most once per HEALTH_CACHE_TTL."""
+        if health_cache["payload"] and time.monotonic() - health_cache["timestamp"] < HEALTH_CACHE_TTL:
+            return health_cache["payload"]
+        
+        if health_cache["lock"] is None:
+            health_cache["lock"] = asyncio.Lock()
+        
+        async with health_cache["lock"]:
+            # Another poll may have refreshed the payload while we waited
+            if health_cache["payload"] and time.monotonic() - health_cache["timestamp"] < HEALTH_CACHE_TTL:
+                return health_cache["payload"]
+            
+            health_cache["payload"] = {
+                "status": "healthy",
+                "service": "GarvisNeuralMind Community",
+                "version": "2.0.0",
+                "community_features": {
+                    "users_online": len(websocket_manager.active_connections),
+                    "community_health": await community_manager.get_health_status()
+                }
+            }
+            health_cache["timestamp"] = time.monotonic()
+            return health_cache["payload"]
+    
     @app.get("/health")
-    async def health_check():
+    async def health_check(request: Request):
         """Health check endpoint."""
-        return {
-            "status": "healthy",
-            "service": "GarvisNeuralMind Community",
-            "version": "2.0.0",
-            "community_features": {
-                "users_online": len(websocket_manager.active_connections),
-                "community_health": await community_manager.get_health_status()
-            }
-        }
+        return cached_json_response(request, await _get_health_payload(), max_age=2)
     
     # Community status endpoint
     @app.get("/community/status")
-    async def community_status():
+    async def community_status(request: Request):
         """Get community status and statistics."""
-        return await community_manager.get_community_stats()
+        stats = await community_manager.get_community_stats()
+        return cached_json_response(request, stats, max_age=10)
     
     return app
 
@@ -144,8 +224,11 @@ async def main():
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
-        log_level="info",
-        access_log=True
+        http="httptools",
+        log_level=settings.LOG_LEVEL,
+        access_log=settings.ACCESS_LOG,
+        backlog=settings.BACKLOG,
+        limit_concurrency=settings.LIMIT_CONCURRENCY
     )
     
     server = uvicorn.Server(config)
@@ -153,4 +236,8 @@ async def main():
 
 
 if __name__ == "__main__":
+    # asyncio.run() creates the loop before uvicorn sees its config,
+    # so the uvloop policy has to be installed here.
+    if UVLOOP_AVAILABLE:
+        uvloop.install()
     asyncio.run(main())
\ No newline at end of file
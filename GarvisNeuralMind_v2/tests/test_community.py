@@ -0,0 +1,231 @@
+"""
+Community manager tests: Redis vote counters, vote flushing and keyset pagination.
+
+Redis and the database session are mocked; no services need to be running.
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.core import database
+from src.community import manager as manager_module
+from src.community.manager import CommunityManager
+
+
+class FakePipeline:
+    """Records queued Redis commands and returns canned results on execute()."""
+
+    def __init__(self, results=None):
+        self.calls = []
+        self.results = results or []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args))
+
+    async def execute(self):
+        return self.results
+
+
+def make_session_factory(session):
+    """Build an AsyncSessionLocal stand-in that yields the given session."""
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=session)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    return factory
+
+
+def make_session(*results):
+    """Build a session whose execute() returns the given results in order."""
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=list(results))
+    session.commit = AsyncMock()
+    return session
+
+
+# Redis vote counters
+
+@pytest.mark.asyncio
+async def test_pop_post_vote_deltas_reads_and_clears_counters(monkeypatch):
+    pipe = FakePipeline(results=[{b"upvote": b"3", b"downvote": b"1"}, 1, {}, 0])
+    redis_client = MagicMock()
+    redis_client.spop = AsyncMock(return_value=[b"1", b"2"])
+    redis_client.pipeline.return_value = pipe
+    monkeypatch.setattr(database, "redis_client", redis_client)
+
+    deltas = await database.pop_post_vote_deltas(max_posts=10)
+
+    # Post 2's hash was already empty, so it is left out
+    assert deltas == {1: {"upvote": 3, "downvote": 1}}
+    redis_client.spop.assert_awaited_once_with(database.DIRTY_VOTES_KEY, 10)
+    redis_client.pipeline.assert_called_once_with(transaction=True)
+    assert pipe.calls == [
+        ("hgetall", ("post:1:votes",)),
+        ("delete", ("post:1:votes",)),
+        ("hgetall", ("post:2:votes",)),
+        ("delete", ("post:2:votes",)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pop_post_vote_deltas_without_dirty_posts(monkeypatch):
+    redis_client = MagicMock()
+    redis_client.spop = AsyncMock(return_value=[])
+    monkeypatch.setattr(database, "redis_client", redis_client)
+
+    assert await database.pop_post_vote_deltas() == {}
+    redis_client.pipeline.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_restore_post_vote_deltas_adds_counts_back(monkeypatch):
+    pipe = FakePipeline()
+    redis_client = MagicMock()
+    redis_client.pipeline.return_value = pipe
+    monkeypatch.setattr(database, "redis_client", redis_client)
+
+    await database.restore_post_vote_deltas({5: {"upvote": 2, "downvote": 1}})
+
+    assert pipe.calls == [
+        ("hincrby", ("post:5:votes", "upvote", 2)),
+        ("hincrby", ("post:5:votes", "downvote", 1)),
+        ("sadd", (database.DIRTY_VOTES_KEY, 5)),
+    ]
+
+
+# Vote flushing
+
+@pytest.fixture
+def vote_flush(monkeypatch):
+    """Patch the Redis helpers _flush_vote_counters uses and return the mocks."""
+    deltas = {
+        1: {"upvote": 2},
+        2: {"upvote": 1, "downvote": 4},
+        3: {"downvote": 1},
+    }
+    mocks = SimpleNamespace(
+        deltas=deltas,
+        pop=AsyncMock(return_value=deltas),
+        restore=AsyncMock(),
+        invalidate=AsyncMock(),
+        publish=AsyncMock(),
+    )
+    monkeypatch.setattr(manager_module, "pop_post_vote_deltas", mocks.pop)
+    monkeypatch.setattr(manager_module, "restore_post_vote_deltas", mocks.restore)
+    monkeypatch.setattr(manager_module, "invalidate_user_profile", mocks.invalidate)
+    monkeypatch.setattr(manager_module, "publish_user_event", mocks.publish)
+    return mocks
+
+
+@pytest.mark.asyncio
+async def test_flush_vote_counters_updates_posts_and_awards_authors(monkeypatch, vote_flush):
+    authors = MagicMock()
+    authors.all.return_value = [(1, 7), (2, 7)]
+    session = make_session(MagicMock(), authors)
+    monkeypatch.setattr(manager_module, "AsyncSessionLocal", make_session_factory(session))
+
+    manager = CommunityManager()
+    manager._award_experience = AsyncMock(return_value=4)
+
+    await manager._flush_vote_counters()
+
+    # One executemany UPDATE carries every post's deltas
+    _, params = session.execute.await_args_list[0].args
+    assert params == [
+        {"post_id": 1, "up": 2, "down": 0},
+        {"post_id": 2, "up": 1, "down": 4},
+        {"post_id": 3, "up": 0, "down": 1},
+    ]
+
+    # Both upvoted posts belong to user 7: (2 + 1) upvotes * 5 points, awarded once
+    manager._award_experience.assert_awaited_once_with(session, 7, 15, "post_upvoted")
+    session.commit.assert_awaited_once()
+    vote_flush.restore.assert_not_awaited()
+    vote_flush.invalidate.assert_awaited_once_with(7)
+    vote_flush.publish.assert_awaited_once_with({"type": "level_up", "user_id": 7, "level": 4})
+
+
+@pytest.mark.asyncio
+async def test_flush_vote_counters_restores_deltas_on_failure(monkeypatch, vote_flush):
+    session = make_session(RuntimeError("database unavailable"))
+    monkeypatch.setattr(manager_module, "AsyncSessionLocal", make_session_factory(session))
+
+    with pytest.raises(RuntimeError):
+        await CommunityManager()._flush_vote_counters()
+
+    vote_flush.restore.assert_awaited_once_with(vote_flush.deltas)
+    session.commit.assert_not_awaited()
+    vote_flush.invalidate.assert_not_awaited()
+    vote_flush.publish.assert_not_awaited()
+
+
+# Keyset pagination
+
+def feed_row(post_id: int, created_at: datetime) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=post_id, title=f"Post {post_id}", content="", post_type="text",
+        upvotes=0, downvotes=0, comment_count=0, tags=[], created_at=created_at,
+        author_id=1, username="author", display_name=None, avatar_url=None,
+        reputation_score=0.0
+    )
+
+
+@pytest.mark.asyncio
+async def test_community_feed_full_page_returns_next_cursor(monkeypatch):
+    rows = [feed_row(9, datetime(2024, 1, 2)), feed_row(8, datetime(2024, 1, 1))]
+    result = MagicMock()
+    result.all.return_value = rows
+    session = make_session(result)
+    monkeypatch.setattr(manager_module, "AsyncSessionLocal", make_session_factory(session))
+
+    page = await CommunityManager().get_community_feed(limit=2, cursor=(datetime(2024, 1, 3), 10))
+
+    assert [item["id"] for item in page["items"]] == [9, 8]
+    assert page["next_cursor"] == (datetime(2024, 1, 1), 8)
+
+    query = str(session.execute.await_args.args[0])
+    assert "(posts.created_at, posts.id) <" in query
+    assert "OFFSET" not in query
+
+
+@pytest.mark.asyncio
+async def test_community_feed_last_page_has_no_cursor(monkeypatch):
+    result = MagicMock()
+    result.all.return_value = [feed_row(1, datetime(2024, 1, 1))]
+    session = make_session(result)
+    monkeypatch.setattr(manager_module, "AsyncSessionLocal", make_session_factory(session))
+
+    page = await CommunityManager().get_community_feed(limit=2)
+
+    assert len(page["items"]) == 1
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_community_list_cursor_seeks_past_last_community(monkeypatch):
+    communities = [
+        SimpleNamespace(
+            id=community_id, name=f"Community {community_id}", description=None,
+            avatar_url=None, member_count=member_count, category=None, tags=[],
+            created_at=None
+        )
+        for community_id, member_count in [(4, 30), (6, 12)]
+    ]
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = communities
+    session = make_session(result)
+    monkeypatch.setattr(manager_module, "AsyncSessionLocal", make_session_factory(session))
+
+    page = await CommunityManager().get_community_list(limit=2, cursor=(40, 2))
+
+    assert [item["id"] for item in page["items"]] == [4, 6]
+    assert page["next_cursor"] == (12, 6)
+    assert "(communities.member_count, communities.id) <" in str(session.execute.await_args.args[0])
@@ -0,0 +1,93 @@
+"""
+WebSocket manager tests: outbound relay batching and slow-client handling.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import orjson
+import pytest
+
+from src.community import websocket as websocket_module
+from src.community.websocket import WebSocketManager
+
+
+def make_websocket():
+    websocket = MagicMock()
+    websocket.accept = AsyncMock()
+    websocket.send_text = AsyncMock()
+    websocket.close = AsyncMock()
+    return websocket
+
+
+async def drain():
+    """Give relay tasks a few loop iterations to send what is queued."""
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+async def connect_quietly(manager: WebSocketManager, user_id: str, websocket):
+    """Connect a user and wait until the welcome message has been relayed."""
+    await manager.connect(websocket, user_id)
+    await drain()
+    websocket.send_text.reset_mock()
+
+
+async def disconnect_and_wait(manager: WebSocketManager, user_id: str):
+    """Disconnect a user and let the cancelled relay task finish."""
+    relay = manager._relays[user_id]
+    manager.disconnect(user_id)
+    await asyncio.gather(relay, return_exceptions=True)
+    await drain()
+
+
+@pytest.mark.asyncio
+async def test_relay_sends_single_message_unwrapped():
+    manager = WebSocketManager()
+    websocket = make_websocket()
+    await connect_quietly(manager, "alice", websocket)
+
+    await manager.send_personal_message("alice", {"type": "ping"})
+    await drain()
+
+    websocket.send_text.assert_awaited_once_with('{"type":"ping"}')
+    await disconnect_and_wait(manager, "alice")
+
+
+@pytest.mark.asyncio
+async def test_relay_batches_queued_messages_into_array():
+    manager = WebSocketManager()
+    websocket = make_websocket()
+    await connect_quietly(manager, "alice", websocket)
+
+    # Queued before the relay runs again, so they go out as one frame
+    total = websocket_module.MAX_BATCH_SIZE + 3
+    for n in range(total):
+        await manager.send_personal_message("alice", {"n": n})
+    await drain()
+
+    frames = [call.args[0] for call in websocket.send_text.await_args_list]
+    assert len(frames) == 2
+    assert orjson.loads(frames[0]) == [{"n": n} for n in range(websocket_module.MAX_BATCH_SIZE)]
+    assert orjson.loads(frames[1]) == [{"n": n} for n in range(websocket_module.MAX_BATCH_SIZE, total)]
+    await disconnect_and_wait(manager, "alice")
+
+
+
+@pytest.mark.asyncio
+async def test_full_outbound_queue_drops_and_closes_client(monkeypatch):
+    monkeypatch.setattr(websocket_module, "OUTBOUND_QUEUE_SIZE", 2)
+    manager = WebSocketManager()
+    websocket = make_websocket()
+    await connect_quietly(manager, "alice", websocket)
+    relay = manager._relays["alice"]
+
+    for n in range(3):
+        await manager.send_personal_message("alice", {"n": n})
+    await asyncio.gather(relay, return_exceptions=True)
+    await drain()
+
+    assert "alice" not in manager.active_connections
+    assert "alice" not in manager.outbound
+    assert relay.done()
+    websocket.close.assert_awaited_once_with(code=websocket_module.SLOW_CLIENT_CLOSE_CODE)